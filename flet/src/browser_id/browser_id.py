@@ -1,7 +1,9 @@
+import asyncio
+import re
 from datetime import UTC, datetime
-from inspect import isawaitable
+from inspect import isawaitable, iscoroutinefunction
 from logging import getLogger
-from typing import Any, Awaitable, Callable, List, Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 from uuid import UUID
 
 import flet as ft
@@ -19,13 +21,43 @@ except ImportError:
 
 logger = getLogger(__name__)
 
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"  # created_at/updated_atの保存形式(UTC, ISO 8601)
+
+# RFC 4122 variant の正規形(ハイフン区切り36文字)のUUID
+_UUID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$", re.IGNORECASE)
+
+_MISSING = object()  # キャッシュに値が読み込まれていないことを表す番兵
+
+
+def _copy_attribute(value: Any) -> Any:
+    """呼び出し側での変更がキャッシュに波及しないよう、リストはコピーして扱います。"""
+    return list(value) if isinstance(value, list) else value
+
+
 class Browser:
     """
     Fletクライアントストレージを使用してUUIDv7を保存・取得・管理するライブラリです。
     """
-    MAX_RETRY_VALIDATION = 10  # ブラウザID検証の最大試行回数
+    MAX_RETRY_VALIDATION = 10  # ブラウザID検証の最大試行回数(既定値)
+    __slots__ = (
+        "__weakref__",
+        "max_retry_validation",
+        "storage",
+        "_app_name",
+        "_prefix",
+        "_id_validation_func",
+        "_validate",
+        "_key_browser_id",
+        "_key_created_at",
+        "_key_updated_at",
+        "_attr_prefix",
+        "_cached_id",
+        "_cached_created_at",
+        "_cached_updated_at",
+        "_attr_cache",
+    )
 
-    def __init__(self, page: ft.Page, app_name: str, prefix: str = "browser_id_lib", id_validation_func: Optional[Callable[UUID, Union[bool, Awaitable[bool]]]] = None):
+    def __init__(self, page: ft.Page, app_name: str, prefix: str = "browser_id_lib", id_validation_func: Optional[Callable[UUID, Union[bool, Awaitable[bool]]]] = None, max_retry_validation: Optional[int] = None):
         """
         :param page: 現在のFletアプリケーションのft.Pageオブジェクト
         :type page: flet.Page   
@@ -39,49 +71,136 @@ class Browser:
             サーバに生成されたIDの登録可否を問い合わせる用途で使用できます。)
         :type browser_id_validation_func: Optional[Callable[uuid.UUID, Union[bool, Awaitable[bool]]]]
             (UUIDを受け取り、受理可否をboolで返す同期/非同期関数を指定できます。)
+        :param max_retry_validation: ブラウザID検証の最大試行回数
+            (省略した場合はMAX_RETRY_VALIDATIONが使用されます。)
+        :type max_retry_validation: Optional[int]
         """
         self.storage = page.client_storage
-        self.app_name = app_name
-        self.prefix = prefix
+        self._app_name = app_name
+        self._prefix = prefix
         self.id_validation_func = id_validation_func
+        self.max_retry_validation = self.MAX_RETRY_VALIDATION if max_retry_validation is None else max_retry_validation
+        self._update_keys()
+    
+    def _update_keys(self) -> None:
+        """prefixとapp_nameからストレージキーを組み立て直し、キャッシュを破棄します。"""
+        # ストレージキーは呼び出しごとに組み立てずに保持しておく
+        self._key_browser_id = f"{self._prefix}.browser_id"
+        self._key_created_at = f"{self._prefix}.created_at"
+        self._key_updated_at = f"{self._prefix}.updated_at"
+        self._attr_prefix = f"{self._prefix}.{self._app_name}."
+        # 取得済みのブラウザIDと日時(ストレージへの問い合わせを省略するために保持する)
+        # (_MISSINGは未読み込み、Noneはストレージに存在しないことを表す)
+        self._cached_id: Any = _MISSING
+        self._cached_created_at: Any = _MISSING
+        self._cached_updated_at: Any = _MISSING
+        # 取得・保存済みの属性値(Noneはストレージに存在しないことを表す)
+        # (読み込みの省略にのみ使用し、書き込み・削除は常にストレージに対して行う)
+        self._attr_cache: Dict[str, Any] = {}
     
     @property
-    async def id(self) -> Optional[str]:
-        """ブラウザIDを取得します。
-
-        ブラウザIDがまだ存在しない時には新たに生成します。
+    def app_name(self) -> str:
+        """実験アプリケーションの名前"""
+        return self._app_name
+    
+    @app_name.setter
+    def app_name(self, app_name: str) -> None:
+        self._app_name = app_name
+        self._update_keys()
+    
+    @property
+    def prefix(self) -> str:
+        """ストレージキーのプレフィックス"""
+        return self._prefix
+    
+    @prefix.setter
+    def prefix(self, prefix: str) -> None:
+        self._prefix = prefix
+        self._update_keys()
+    
+    @property
+    def id_validation_func(self) -> Optional[Callable[UUID, Union[bool, Awaitable[bool]]]]:
+        """ブラウザIDの検証関数"""
+        return self._id_validation_func
+    
+    @id_validation_func.setter
+    def id_validation_func(self, func: Optional[Callable[UUID, Union[bool, Awaitable[bool]]]]) -> None:
+        self._id_validation_func = func
+        # async def の関数は設定時に判定し、生成時には常にawaitできる形で呼び出す
+        # (lambdaや__call__がasyncのオブジェクトなど、awaitableを返す同期関数もあるため戻り値も確認する)
+        if func is None or iscoroutinefunction(func):
+            self._validate = func
+        else:
+            async def validate(id):
+                is_valid = func(id)
+                if isawaitable(is_valid):
+                    is_valid = await is_valid
+                return is_valid
+            self._validate = validate
+    
+    async def prewarm(self) -> None:
+        """ブラウザIDと生成・更新日時をまとめて読み込み、メモリ上にキャッシュします。
 
-        :return: 保存されていたブラウザID、または生成された新しいブラウザID。生成に失敗した場合はNone。
-        :rtype: str | None
+        アプリ起動時に一度呼び出しておくと、以降の取得でストレージへの問い合わせが不要になります。
+        ブラウザIDが存在しない場合でも新たに生成はしません。
         """
-        return await self.get_id()
+        id, created_at, updated_at = await asyncio.gather(
+            self.storage.get(self._key_browser_id),
+            self.storage.get(self._key_created_at),
+            self.storage.get(self._key_updated_at),
+        )
+        # 読み込み中に生成・削除された場合はその結果を優先する
+        if self._cached_id is _MISSING:
+            self._cached_id = id
+        if self._cached_created_at is _MISSING:
+            self._cached_created_at = created_at
+        if self._cached_updated_at is _MISSING:
+            self._cached_updated_at = updated_at
     
-    @property
-    async def created_at(self) -> Optional[str]:
+    async def get_created_at(self) -> Optional[str]:
         """ブラウザIDの生成日時を取得します。
 
         :return: 保存されていたブラウザIDの生成日時。生成日時が保存されていない場合はNone。
         :rtype: str | None
         """
-        return await self.storage.get(f"{self.prefix}.created_at")
+        if self._cached_created_at is _MISSING:
+            created_at = await self.storage.get(self._key_created_at)
+            if self._cached_created_at is _MISSING:
+                self._cached_created_at = created_at
+        return self._cached_created_at
     
-    @property
-    async def updated_at(self) -> Optional[str]:
+    async def get_updated_at(self) -> Optional[str]:
         """ブラウザIDの更新日時を取得します。
 
         :return: 保存されていたブラウザIDの更新日時。更新日時が保存されていない場合はNone。
         :rtype: str | None
         """
-        return await self.storage.get(f"{self.prefix}.updated_at")
+        if self._cached_updated_at is _MISSING:
+            updated_at = await self.storage.get(self._key_updated_at)
+            if self._cached_updated_at is _MISSING:
+                self._cached_updated_at = updated_at
+        return self._cached_updated_at
     
-    @property
-    async def id_version(self) -> Optional[int]:
+    async def get_id_version(self) -> Optional[int]:
         """ブラウザIDのバージョンを取得します。
 
         :return: 保存されていたブラウザIDのバージョン。バージョンが保存されていない場合はNone。
         :rtype: int | None
         """
-        return UUID(await self.id).version
+        id = await self.get_id()
+        if id is None:
+            return None
+        if _UUID_PATTERN.match(id):
+            # バージョンは13桁目の16進数に格納されている(ハイフン込みで14文字目)
+            return int(id[14], 16)
+        # 正規形でない場合はUUIDとして解析する(UUIDでない場合はValueErrorを送出する)
+        return UUID(id).version
+
+    # 後方互換のため、awaitable を返すプロパティとしても参照できるようにする
+    # (コルーチンを二重に生成しないよう、メソッドを直接 getter として使用する)
+    created_at = property(get_created_at)
+    updated_at = property(get_updated_at)
+    id_version = property(get_id_version)
     
     async def _generate_id(self) -> Optional[str]:
         """UUIDv7を(再)生成してbrowser_idに保存します。
@@ -93,31 +212,54 @@ class Browser:
         :rtype: str | None
         """
         logger.info("Generating new browser ID...")
-        for _ in range(self.MAX_RETRY_VALIDATION):
-            new_id = str(uuid7())
-            if self.id_validation_func:
-                is_valid = self.id_validation_func(new_id)
-                if isawaitable(is_valid):
-                    is_valid = await is_valid
-            else:
-                is_valid = True
-            if is_valid:
-                is_successful = await self.storage.set(f"{self.prefix}.browser_id", new_id)
-                if await self.storage.contains_key_async(f"{self.prefix}.created_at"):
-                    await self.storage.set(f"{self.prefix}.updated_at", datetime.now(UTC).isoformat().replace("+00:00", "Z"))
-                    logger.debug("updated_at written", await self.storage.get(f"{self.prefix}.created_at"), type(await (self.storage.contains_key_async(f"{self.prefix}.created_at"))))
+        # 検証関数はリトライごとに参照するため、ローカル変数に束縛しておく
+        validate = self._validate
+        for _ in range(self.max_retry_validation):
+            new_uuid = uuid7()
+            # 検証関数にはUUIDオブジェクトを渡し、文字列への変換は保存時の一度だけにする
+            if validate is None or await validate(new_uuid):
+                new_id = str(new_uuid)
+                now = datetime.now(UTC).strftime(TIMESTAMP_FORMAT)
+                # 存在確認と値の取得を一度の問い合わせで済ませる(キャッシュ済みなら問い合わせ不要)
+                created_at = await self.get_created_at()
+                is_regenerated = created_at is not None
+                timestamp_key = self._key_updated_at if is_regenerated else self._key_created_at
+                # browser_idと日時は互いに独立しているため、同時に書き込んで往復回数を減らす
+                is_successful, _ = await asyncio.gather(
+                    self.storage.set(self._key_browser_id, new_id),
+                    self.storage.set(timestamp_key, now),
+                )
+                if is_regenerated:
+                    logger.debug("updated_at written (created_at: %s)", created_at)
                 else:
-                    await self.storage.set(f"{self.prefix}.created_at", datetime.now(UTC).isoformat().replace("+00:00", "Z"))
                     logger.debug("created_at written")
                 if is_successful:
-                    logger.info("Browser ID generated: ", new_id)
+                    self._cached_id = new_id
+                    if is_regenerated:
+                        self._cached_updated_at = now
+                    else:
+                        self._cached_created_at = now
+                    logger.info("Browser ID generated: %s", new_id)
                     return new_id
                 else:
                     logger.error("Failed to save browser_id to localStorage")
                     return None
-            else:
-                logger.error("Failed to generate valid browser ID after maximum retries")
-                return None
+        logger.error("Failed to generate valid browser ID after maximum retries")
+        return None
+
+    async def peek_id(self) -> Optional[str]:
+        """ブラウザIDを生成せずに取得します。
+
+        画面描画時など、IDが必須ではない場面で生成とストレージへの書き込みを避けるために使用できます。
+
+        :return: 保存されていたブラウザID。まだ存在しない場合はNone。
+        :rtype: str | None
+        """
+        if self._cached_id is _MISSING:
+            id = await self.storage.get(self._key_browser_id)
+            if self._cached_id is _MISSING:
+                self._cached_id = id
+        return self._cached_id
 
     async def get_id(self) -> Optional[str]:
         """ブラウザIDを取得します。
@@ -128,13 +270,16 @@ class Browser:
         :rtype: str | None
         """
         logger.info("Getting browser ID...")
-        id = await self.storage.get(f"{self.prefix}.browser_id")
+        id = await self.peek_id()
+        # 空文字列はIDとして扱わず再生成する(JS/TS版と同じ判定)
         if id:
-            logger.info("Browser ID found: ", id)
+            logger.info("Browser ID found: %s", id)
             return id
         else:
             logger.info("Browser ID not found, generating new browser ID...")
             return await self._generate_id()
+
+    id = property(get_id)
     
     async def id_exists(self) -> bool:
         """ブラウザIDがストレージに存在するかを確認します。
@@ -142,7 +287,7 @@ class Browser:
         :return: ブラウザIDが存在する場合はTrue、それ以外はFalse
         :rtype: bool
         """
-        return await self.storage.contains_key(f"{self.prefix}.browser_id")
+        return await self.storage.contains_key(self._key_browser_id)
     
     async def _delete_id(self) -> bool:
         """ブラウザIDをストレージから削除します。
@@ -153,10 +298,16 @@ class Browser:
         :return: 削除に成功した場合はTrue、それ以外はFalse
         :rtype: bool
         """
-        is_successful = await self.storage.remove(f"{self.prefix}.browser_id")
+        is_successful = await self.storage.remove(self._key_browser_id)
+        self._cached_id = _MISSING
         if is_successful:
-            await self.storage.remove(f"{self.prefix}.created_at")
-            await self.storage.remove(f"{self.prefix}.updated_at")
+            # 日時はbrowser_idの削除に成功した場合のみ、まとめて削除する
+            await asyncio.gather(
+                self.storage.remove(self._key_created_at),
+                self.storage.remove(self._key_updated_at),
+            )
+            self._cached_created_at = _MISSING
+            self._cached_updated_at = _MISSING
             logger.warning("Browser ID was deleted!")
         else:
             logger.error("Failed to delete browser ID")
@@ -175,7 +326,13 @@ class Browser:
         :return: 保存に成功した場合はTrue、それ以外はFalse
         :rtype: bool
         """
-        return await self.storage.set(f"{self.prefix}.{self.app_name}.{field}", value)
+        # ストレージは他のインスタンスやタブと共有されているため、キャッシュと同じ値でも必ず書き込む
+        is_successful = await self.storage.set(self._attr_prefix + field, value)
+        if is_successful:
+            self._attr_cache[field] = _copy_attribute(value)
+        else:
+            self._attr_cache.pop(field, None)
+        return is_successful
     
     async def get_attribute(self, field: str, default: Any = None) -> Union[int, float, bool, str, List[str], None, Any]:
         """指定されたフィールドから値を取得します。
@@ -188,13 +345,47 @@ class Browser:
         :return: 保存されていた属性値、またはデフォルト値
         :rtype: Any
         """
-        value = await self.storage.get(f"{self.prefix}.{self.app_name}.{field}")
-        if value:
-            return value
+        value = self._attr_cache.get(field, _MISSING)
+        if value is _MISSING:
+            value = await self.storage.get(self._attr_prefix + field)
+            # 読み込み中に完了したset_attribute/delete_attributeの結果を古い値で上書きしない
+            self._attr_cache.setdefault(field, _copy_attribute(value))
+        if value is not None:
+            return _copy_attribute(value)
         else:
             logger.info(f"Attribute {field} does not exist, returning default value")
             return default
     
+    async def set_attributes(self, attributes: Dict[str, Union[int, float, bool, str, List[str], None]]) -> bool:
+        """複数のフィールドに値をまとめて保存します。
+
+        各フィールドの書き込みは同時に行われます。
+        
+        :param attributes: フィールド名と保存する値の辞書
+        :type attributes: dict[str, int | float | bool | str | list[str] | None]
+        
+        :return: すべての保存に成功した場合はTrue、それ以外はFalse
+        :rtype: bool
+        """
+        results = await asyncio.gather(*(self.set_attribute(field, value) for field, value in attributes.items()))
+        return all(results)
+    
+    async def get_attributes(self, fields: List[str], default: Any = None) -> Dict[str, Union[int, float, bool, str, List[str], None, Any]]:
+        """複数のフィールドから値をまとめて取得します。
+
+        各フィールドの読み込みは同時に行われます。
+        
+        :param fields: フィールド名のリスト
+        :type fields: list[str]
+        :param default: 値が存在しないフィールドに対するデフォルト値
+        :type default: Any
+        
+        :return: フィールド名と属性値(またはデフォルト値)の辞書
+        :rtype: dict[str, Any]
+        """
+        values = await asyncio.gather(*(self.get_attribute(field, default) for field in fields))
+        return dict(zip(fields, values))
+    
     async def attributes_exists(self, field: str) -> bool:
         """指定されたフィールドがストレージに存在するかを確認します。
         
@@ -204,7 +395,7 @@ class Browser:
         :return: 属性が存在する場合はTrue、それ以外はFalse
         :rtype: bool
         """
-        return await self.storage.contains_key(f"{self.prefix}.{self.app_name}.{field}")
+        return await self.storage.contains_key(self._attr_prefix + field)
 
     async def delete_attribute(self, field: str) -> bool:
         """指定されたフィールドの値をストレージから削除します。
@@ -216,4 +407,8 @@ class Browser:
         :rtype: bool
         """
         logger.info(f"Deleting attribute {field}")
-        return await self.storage.remove(f"{self.prefix}.{self.app_name}.{field}")
+        self._attr_cache.pop(field, None)
+        is_successful = await self.storage.remove(self._attr_prefix + field)
+        if is_successful:
+            self._attr_cache.setdefault(field, None)
+        return is_successful
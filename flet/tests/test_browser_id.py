@@ -1,4 +1,8 @@
+import asyncio
+import functools
+import weakref
 from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID
 
 import pytest
 from browser_id import Browser
@@ -6,12 +10,16 @@ from browser_id import Browser
 import flet as ft
 
 
-@pytest.fixture
-def mock_page():
+@pytest.fixture(scope="module")
+def storage():
+    return {}
+
+@pytest.fixture(scope="module")
+def shared_page(storage):
+    # MagicMock(spec=ft.Page) introspects the whole Page class, so build it once per module
     page = MagicMock(spec=ft.Page)
     page.client_storage = AsyncMock()
     # Setup client_storage mocks
-    storage = {}
     
     async def get_value(key):
         return storage.get(key)
@@ -25,13 +33,25 @@ def mock_page():
             del storage[key]
             return True
         return False # Or True? Implementation returns result of remove.
+    
+    async def contains_key(key):
+        return key in storage
         
     page.client_storage.get.side_effect = get_value
     page.client_storage.set.side_effect = set_value
     page.client_storage.remove.side_effect = remove_value
+    page.client_storage.contains_key.side_effect = contains_key
+    page.client_storage.contains_key_async.side_effect = contains_key
     
     return page
 
+@pytest.fixture
+def mock_page(shared_page, storage):
+    # Reset stored values and call counts for each test (side effects are kept)
+    storage.clear()
+    shared_page.client_storage.reset_mock()
+    return shared_page
+
 @pytest.mark.asyncio
 async def test_browser_id_generation(mock_page):
     def browser_id_validation_func1(uuid):
@@ -56,6 +76,76 @@ async def test_browser_id_generation(mock_page):
     # Key should be "browser_id.browser_id"
     assert await mock_page.client_storage.get("browser_id_lib.browser_id") == id1
 
+@pytest.mark.asyncio
+async def test_browser_id_validation_retry(mock_page):
+    candidates = []
+    
+    def browser_id_validation_func(uuid):
+        candidates.append(uuid)
+        return len(candidates) >= 3
+    
+    browser = Browser(mock_page, app_name="test_app", id_validation_func=browser_id_validation_func)
+    
+    # Should retry until validation succeeds
+    id1 = await browser.id
+    assert len(candidates) == 3
+    assert all(isinstance(candidate, UUID) for candidate in candidates)
+    assert id1 == str(candidates[-1])
+
+@pytest.mark.asyncio
+async def test_browser_id_validation_max_retry(mock_page):
+    candidates = []
+    
+    def browser_id_validation_func(uuid):
+        candidates.append(uuid)
+        return False
+    
+    browser = Browser(mock_page, app_name="test_app", id_validation_func=browser_id_validation_func)
+    
+    assert await browser.id is None
+    assert len(candidates) == Browser.MAX_RETRY_VALIDATION
+
+@pytest.mark.asyncio
+async def test_browser_id_validation_awaitable_result(mock_page):
+    async def reject(uuid):
+        return False
+    
+    class AsyncValidator:
+        async def __call__(self, uuid):
+            return False
+    
+    @functools.wraps(reject)
+    def wrapped(uuid):
+        return reject(uuid)
+    
+    # Validators that are not `async def` but return an awaitable must still be awaited
+    for validation_func in (lambda uuid: reject(uuid), AsyncValidator(), wrapped):
+        browser = Browser(mock_page, app_name="test_app", id_validation_func=validation_func)
+        assert await browser.id is None
+        assert await mock_page.client_storage.get("browser_id_lib.browser_id") is None
+
+@pytest.mark.asyncio
+async def test_browser_id_validation_custom_max_retry(mock_page):
+    candidates = []
+    
+    def browser_id_validation_func(uuid):
+        candidates.append(uuid)
+        return False
+    
+    browser = Browser(mock_page, app_name="test_app", id_validation_func=browser_id_validation_func, max_retry_validation=3)
+    assert await browser.id is None
+    assert len(candidates) == 3
+    
+    # The retry limit can also be changed per instance after construction
+    candidates.clear()
+    browser.max_retry_validation = 2
+    assert await browser.id is None
+    assert len(candidates) == 2
+
+def test_browser_weakref(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    assert weakref.ref(browser)() is browser
+
 @pytest.mark.asyncio
 async def test_browser_id_persistence(mock_page):
     browser = Browser(mock_page, app_name="test_app")
@@ -65,6 +155,88 @@ async def test_browser_id_persistence(mock_page):
     
     assert id1 == id2
 
+@pytest.mark.asyncio
+async def test_browser_id_cached(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    id1 = await browser.id
+    call_count = mock_page.client_storage.get.call_count
+    
+    # Subsequent reads should not hit storage
+    assert await browser.id == id1
+    assert mock_page.client_storage.get.call_count == call_count
+
+@pytest.mark.asyncio
+async def test_browser_id_methods(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    id1 = await browser.get_id()
+    assert await browser.id == id1
+    assert await browser.get_created_at() == await browser.created_at
+    assert await browser.get_created_at() is not None
+    assert await browser.get_id_version() == await browser.id_version == 7
+
+@pytest.mark.asyncio
+async def test_empty_browser_id_regenerated(mock_page):
+    await mock_page.client_storage.set("browser_id_lib.browser_id", "")
+    browser = Browser(mock_page, app_name="test_app")
+    
+    # An empty stored ID should be replaced with a new one
+    id1 = await browser.id
+    assert id1
+    assert await mock_page.client_storage.get("browser_id_lib.browser_id") == id1
+
+@pytest.mark.asyncio
+async def test_browser_id_version_non_canonical(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    id1 = await browser.id
+    
+    # Unhyphenated IDs are parsed as UUIDs
+    await mock_page.client_storage.set("browser_id_lib.browser_id", id1.replace("-", ""))
+    browser = Browser(mock_page, app_name="test_app")
+    assert await browser.get_id_version() == 7
+    
+    # Malformed IDs raise ValueError
+    for malformed in ("abc", "zzzzzzzz-zzzz-7zzz-8zzz-zzzzzzzzzzzz"):
+        await mock_page.client_storage.set("browser_id_lib.browser_id", malformed)
+        browser = Browser(mock_page, app_name="test_app")
+        with pytest.raises(ValueError):
+            await browser.get_id_version()
+
+@pytest.mark.asyncio
+async def test_prewarm(mock_page):
+    id1 = await Browser(mock_page, app_name="test_app").id
+    
+    browser = Browser(mock_page, app_name="test_app")
+    await browser.prewarm()
+    call_count = mock_page.client_storage.get.call_count
+    
+    # Reads after prewarm should not hit storage, including keys found missing
+    assert await browser.id == id1
+    assert await browser.created_at is not None
+    assert await browser.updated_at is None
+    assert await browser.updated_at is None
+    assert mock_page.client_storage.get.call_count == call_count
+    
+    # A missing browser ID should also be served from the cache
+    browser = Browser(mock_page, app_name="test_app", prefix="empty")
+    await browser.prewarm()
+    call_count = mock_page.client_storage.get.call_count
+    assert await browser.peek_id() is None
+    assert await browser.peek_id() is None
+    assert mock_page.client_storage.get.call_count == call_count
+
+@pytest.mark.asyncio
+async def test_peek_browser_id(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    # peek should not generate ID
+    assert await browser.peek_id() is None
+    assert await mock_page.client_storage.get("browser_id_lib.browser_id") is None
+    
+    id1 = await browser.id
+    assert await browser.peek_id() == id1
+
 @pytest.mark.asyncio
 async def test_delete_browser_id(mock_page):
     browser = Browser(mock_page, app_name="test_app")
@@ -79,6 +251,41 @@ async def test_delete_browser_id(mock_page):
     id2 = await browser.id
     assert id2 != id1
 
+@pytest.mark.asyncio
+async def test_delete_browser_id_failure(mock_page, monkeypatch):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    id1 = await browser.id
+    created_at = await browser.created_at
+    
+    remove_value = mock_page.client_storage.remove.side_effect
+    
+    async def failing_remove_value(key):
+        if key == "browser_id_lib.browser_id":
+            return False
+        return await remove_value(key)
+    
+    monkeypatch.setattr(mock_page.client_storage.remove, "side_effect", failing_remove_value)
+    
+    # Timestamps should be kept when the browser ID could not be removed
+    assert await browser._delete_id() is False
+    assert await mock_page.client_storage.get("browser_id_lib.browser_id") == id1
+    assert await mock_page.client_storage.get("browser_id_lib.created_at") == created_at
+
+@pytest.mark.asyncio
+async def test_regenerate_browser_id_timestamps(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    await browser.id
+    created_at = await browser.created_at
+    assert created_at is not None
+    assert await browser.updated_at is None
+    
+    # Regeneration should keep created_at and write updated_at
+    await browser._generate_id()
+    assert await browser.created_at == created_at
+    assert await browser.updated_at is not None
+
 @pytest.mark.asyncio
 async def test_attributes(mock_page):
     browser = Browser(mock_page, app_name="test_app")
@@ -103,6 +310,35 @@ async def test_attribute_types(mock_page):
     await browser.set_attribute("list_val", ["a", "b"])
     assert await browser.get_attribute("list_val") == ["a", "b"]
 
+@pytest.mark.asyncio
+async def test_falsy_attribute_values(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    # Falsy values should be returned as stored, not replaced by default
+    await browser.set_attribute("zero", 0)
+    assert await browser.get_attribute("zero", default=-1) == 0
+    
+    await browser.set_attribute("false", False)
+    assert await browser.get_attribute("false", default=True) is False
+    
+    await browser.set_attribute("empty_str", "")
+    assert await browser.get_attribute("empty_str", default="default") == ""
+    
+    await browser.set_attribute("empty_list", [])
+    assert await browser.get_attribute("empty_list", default=["default"]) == []
+    
+    assert await browser.get_attribute("missing", default="default") == "default"
+
+@pytest.mark.asyncio
+async def test_bulk_attributes(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    assert await browser.set_attributes({"attr1": "value1", "attr2": 0}) is True
+    assert await mock_page.client_storage.get("browser_id_lib.test_app.attr1") == "value1"
+    
+    values = await browser.get_attributes(["attr1", "attr2", "missing"], default="default")
+    assert values == {"attr1": "value1", "attr2": 0, "missing": "default"}
+
 @pytest.mark.asyncio
 async def test_delete_attribute(mock_page):
     browser = Browser(mock_page, app_name="test_app")
@@ -112,6 +348,61 @@ async def test_delete_attribute(mock_page):
     
     assert await browser.get_attribute("to_delete") is None
 
+@pytest.mark.asyncio
+async def test_attribute_cache(mock_page):
+    browser = Browser(mock_page, app_name="test_app")
+    
+    await browser.set_attribute("attr", 0)
+    get_count = mock_page.client_storage.get.call_count
+    
+    # Reads after a write should be served from the cache
+    assert await browser.get_attribute("attr") == 0
+    assert mock_page.client_storage.get.call_count == get_count
+    
+    # Mutating a returned list should not affect the cache
+    await browser.set_attribute("list_val", ["a"])
+    values = await browser.get_attribute("list_val")
+    values.append("b")
+    assert await browser.get_attribute("list_val") == ["a"]
+
+@pytest.mark.asyncio
+async def test_attribute_writes_with_shared_storage(mock_page):
+    browser1 = Browser(mock_page, app_name="test_app")
+    browser2 = Browser(mock_page, app_name="test_app")
+    
+    # Writing a value already in the cache should still reach storage
+    await browser1.set_attribute("consent", True)
+    await browser2.set_attribute("consent", False)
+    assert await browser1.set_attribute("consent", True) is True
+    assert await mock_page.client_storage.get("browser_id_lib.test_app.consent") is True
+    
+    # Deleting an attribute cached as missing should still reach storage
+    assert await browser1.get_attribute("field") is None
+    await browser2.set_attribute("field", "x")
+    assert await browser1.delete_attribute("field") is True
+    assert await mock_page.client_storage.get("browser_id_lib.test_app.field") is None
+
+@pytest.mark.asyncio
+async def test_attribute_cache_concurrent_read_write(mock_page, monkeypatch):
+    browser = Browser(mock_page, app_name="test_app")
+    await mock_page.client_storage.set("browser_id_lib.test_app.x", "a")
+    
+    get_value = mock_page.client_storage.get.side_effect
+    
+    async def slow_get_value(key):
+        # Read the value, then yield so that a concurrent write completes first
+        value = await get_value(key)
+        await asyncio.sleep(0)
+        return value
+    
+    monkeypatch.setattr(mock_page.client_storage.get, "side_effect", slow_get_value)
+    
+    # A stale read must not overwrite the cached value of a concurrent write
+    await asyncio.gather(browser.get_attribute("x"), browser.set_attribute("x", "b"))
+    await browser.set_attribute("x", "a")
+    assert await mock_page.client_storage.get("browser_id_lib.test_app.x") == "a"
+    assert await browser.get_attribute("x") == "a"
+
 @pytest.mark.asyncio
 async def test_custom_prefix(mock_page):
     browser = Browser(mock_page, app_name="test_app", prefix="custom")
@@ -121,3 +412,14 @@ async def test_custom_prefix(mock_page):
     
     await browser.set_attribute("attr", "val")
     assert await mock_page.client_storage.get("custom.test_app.attr") == "val"
+    
+    # Changing prefix and app_name should rebuild the storage keys
+    browser.prefix = "other"
+    browser.app_name = "other_app"
+    await browser.set_attribute("attr", "val2")
+    assert await mock_page.client_storage.get("other.other_app.attr") == "val2"
+    
+    # Cached values under the old prefix should be discarded
+    id2 = await browser.id
+    assert await mock_page.client_storage.get("other.browser_id") == id2
+    assert id2 != await mock_page.client_storage.get("custom.browser_id")